@@ -1,13 +1,77 @@
 import os
+import mmap
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 import pandas as pd
+import numpy.lib.format as npy_format
 import utils
-from datetime import datetime, timedelta
 
 
-def load_ensemble_ddpm(working_dir, n_members, params):
+@dataclass
+class Ensemble:
     """
-    Loads the results of an ensemble
+    Fields of an ensemble, stored as one array per parameter
+
+    Attributes:
+        dates (ndarray): dates (str) of the samples
+        echeances (ndarray): echeances (int) of the samples
+        fields (dict): for each parameter (str), an array of shape N x M x H x W (samples, members, height, width)
+    """
+    dates: np.ndarray
+    echeances: np.ndarray
+    fields: dict
+
+    @property
+    def n_members(self):
+        return next(iter(self.fields.values())).shape[1]
+
+    @classmethod
+    def from_dataframe(cls, ens_df, n_members, params):
+        """
+        Builds an ensemble from a dataframe with a column per member and per parameter (named param_member)
+        """
+        fields = {
+            p: np.stack([np.stack(ens_df[p + "_" + str(j + 1)].values) for j in range(n_members)], axis=1)
+            for p in params
+        }
+        return cls(ens_df.dates.values, ens_df.echeances.values, fields)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads an ensemble saved with Ensemble.save()
+        """
+        with np.load(path) as archive:
+            fields = {k[len("field_"):]: archive[k] for k in archive.files if k.startswith("field_")}
+            return cls(archive["dates"].astype(object), archive["echeances"], fields)
+
+    def save(self, path):
+        """
+        Saves the ensemble in a single (uncompressed) .npz file, written exactly at path (no suffix added)
+        """
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                dates=np.asarray(self.dates, dtype=str),
+                echeances=np.asarray(self.echeances),
+                **{"field_" + p: field for p, field in self.fields.items()}
+            )
+
+    def to_dataframe(self):
+        """
+        Returns the ensemble as a dataframe with a column per member and per parameter (named param_member)
+        """
+        columns = {"dates": self.dates, "echeances": self.echeances}
+        for p, field in self.fields.items():
+            for j in range(field.shape[1]):
+                columns[p + "_" + str(j + 1)] = list(field[:, j])
+        return pd.DataFrame(columns)
+
+
+def read_ensemble_ddpm(working_dir, n_members, params):
+    """
+    Reads the results of an ensemble from the y_pred file of each member
 
     Args:
         working_dir (str): filepath to the root of the ensemble
@@ -15,12 +79,9 @@ def load_ensemble_ddpm(working_dir, n_members, params):
         params (list): parameters (str) predicted by the model
 
     Returns:
-        DataFrame: a dataframe that contains all the members for all the parameters in the ensemble
+        Ensemble: all the members for all the parameters in the ensemble
     """
-    ens_df = pd.DataFrame(
-        [],
-        columns = []
-    )
+    fields = {p: [] for p in params}
 
     for i_m in range(n_members):
         path = os.path.join(
@@ -28,13 +89,57 @@ def load_ensemble_ddpm(working_dir, n_members, params):
         )
         y_m = pd.read_pickle(path)
         if i_m == 0:
-            y_m = y_m.rename(columns={p:p + "_" + str(i_m + 1) for p in params})
-        else:
-            y_m = y_m.rename(columns={p:p + "_" + str(i_m + 1) for p in params}).drop(columns=["dates", "echeances"])
-        
-        ens_df = pd.concat([ens_df, y_m], axis=1)
+            dates, echeances = y_m.dates.values, y_m.echeances.values
+        for p in params:
+            fields[p].append(np.stack(y_m[p].values))
     
-    return ens_df
+    return Ensemble(dates, echeances, {p: np.stack(fields[p], axis=1) for p in params})
+
+
+def cache_ensemble(working_dir, n_members, params, cache_path):
+    """
+    Reads the results of an ensemble and gathers all the members in a single cache file
+
+    Args:
+        working_dir (str): filepath to the root of the ensemble
+        n_members (int): number of members in the ensemble
+        params (list): parameters (str) predicted by the model
+        cache_path (str): filepath to the cache (.npz)
+
+    Returns:
+        Ensemble: all the members for all the parameters in the ensemble
+    """
+    ens = read_ensemble_ddpm(working_dir, n_members, params)
+    ens.save(cache_path)
+    return ens
+
+
+def load_ensemble_ddpm(working_dir, n_members, params, cache_path=None):
+    """
+    Loads the results of an ensemble.
+    If a cache file is given, the ensemble is read from it when it exists (and matches n_members and params),
+    otherwise the cache is built from the members.
+    The cache is not invalidated when the y_pred files change: delete it after regenerating the ensemble.
+
+    Args:
+        working_dir (str): filepath to the root of the ensemble
+        n_members (int): number of members in the ensemble
+        params (list): parameters (str) predicted by the model
+        cache_path (str, optional): filepath to the cache (.npz). Defaults to None (no cache).
+
+    Returns:
+        Ensemble: all the members for all the parameters in the ensemble
+    """
+    if cache_path is None:
+        return read_ensemble_ddpm(working_dir, n_members, params)
+
+    if os.path.exists(cache_path):
+        ens = Ensemble.load(cache_path)
+        if all(p in ens.fields for p in params) and ens.n_members == n_members:
+            return Ensemble(ens.dates, ens.echeances, {p: ens.fields[p] for p in params})
+        print('outdated cache : ' + cache_path)
+
+    return cache_ensemble(working_dir, n_members, params, cache_path)
 
 
 def select_indices_echeances(full_ech, real_ech):
@@ -50,6 +155,44 @@ def select_indices_echeances(full_ech, real_ech):
     return indices
 
 
+def fast_load_npy(filepath):
+    """
+    Loads a .npy file as a read-only array backed by a memory map, without copy.
+    Only the header is parsed, the data is then viewed directly from the mapped buffer.
+    Falls back to np.load for the formats this shortcut does not handle.
+
+    Args:
+        filepath (str): filepath to the .npy file
+
+    Returns:
+        ndarray: the array stored in the file
+    """
+    with open(filepath, 'rb') as f:
+        version = npy_format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = npy_format.read_array_header_1_0(f)
+        elif version == (2, 0):
+            shape, fortran_order, dtype = npy_format.read_array_header_2_0(f)
+        else:
+            return np.load(filepath)
+        if dtype.hasobject:
+            return np.load(filepath)
+        offset = f.tell()
+        count = int(np.prod(shape))
+        if count == 0:
+            return np.empty(shape, dtype=dtype)
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    array = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+    return array.reshape(shape, order='F' if fortran_order else 'C')
+
+
+def load_npy_into(filepath, out):
+    """
+    Copies the content of a .npy file into an existing array
+    """
+    np.copyto(out, fast_load_npy(filepath))
+
+
 def load_ensemble_arome(dates, echeances, params, n_members, data_location):
     """
     Loads a dataframe containing results of a PE-Arome ensemble (2,5km)
@@ -62,32 +205,44 @@ def load_ensemble_arome(dates, echeances, params, n_members, data_location):
         data_location (str): filepath to directory containing .npy files
 
     Returns:
-        DataFrame: dataframe containing all the needed fields
+        Ensemble: all the needed fields
     """
-    ens_df = pd.DataFrame(
-        [], 
-        columns = ['dates', 'echeances'] + [p + "_" + str(j + 1) for p in params for j in range(n_members)]
-    )
+    dates_out, echeances_out = [], []
+    fields = {p: [] for p in params}
     domain_shape = utils.get_shape_2km5()
     
-    for i_d, d in enumerate(dates):
-        ens_d = np.zeros((n_members, len(echeances), domain_shape[0], domain_shape[1], len(params)))
-        # charger tous les membres de tous les paramètres
-        try:
+    # the .npy files of a given date are read concurrently: the mmap page-in and the copy into ens_d (both I/O bound, np.copyto releases the GIL)
+    with ThreadPoolExecutor(max_workers=min(32, n_members * len(params))) as executor:
+        for i_d, d in enumerate(dates):
+            # same layout as the .npy files (H x W x echeances) so that each file is copied without transposition,
+            # in single precision like the files (and the reductions of compute_pointwise_stats)
+            ens_d = np.zeros((n_members, len(params), domain_shape[0], domain_shape[1], len(echeances)), dtype=np.float32)
+            # charger tous les membres de tous les paramètres
+            futures = []
             for i_m in range(n_members):
                 for i_p, p in enumerate(params):
                     filepath = data_location + str(i_m + 1) + '/GC81_' + d + 'Z_' + p + '.npy'
-                    ens_d[i_m, :, :, :, i_p] = np.load(filepath).transpose([2, 0, 1])
-        except FileNotFoundError:
-            print('missing day : ' + d)
-            ens_d = None
-        
-        if ens_d is not None:
-            for i_ech, ech in enumerate(echeances):
-                values = [ens_d[i_m, i_ech, :, :, i_p] for i_p in range(len(params)) for i_m in range(n_members)]
-                ens_df.loc[len(ens_df)] = [d, ech] + values
-        
-    return ens_df
+                    futures.append(executor.submit(load_npy_into, filepath, ens_d[i_m, i_p]))
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except FileNotFoundError:
+                print('missing day : ' + d)
+                ens_d = None
+            
+            if ens_d is not None:
+                dates_out += [d] * len(echeances)
+                echeances_out += list(echeances)
+                for i_p, p in enumerate(params):
+                    # echeances x members x H x W
+                    fields[p].append(ens_d[:, i_p].transpose([3, 0, 1, 2]))
+
+    empty = np.zeros((0, n_members, domain_shape[0], domain_shape[1]), dtype=np.float32)
+    return Ensemble(
+        dates=np.array(dates_out, dtype=object),
+        echeances=np.array(echeances_out),
+        fields={p: np.concatenate(fields[p]) if fields[p] else empty for p in params}
+    )
 
 
 def correct_dates_for_arome(arome_ens_df):
@@ -95,24 +250,15 @@ def correct_dates_for_arome(arome_ens_df):
     Corrects dates for the real Arome ensemble
 
     Args:
-        arome_ens_df (DataFrame): Arome ensemble data loaded with load_ensemble_arome()
+        arome_ens_df (DataFrame): Arome ensemble data loaded with load_ensemble_arome(), as a dataframe
 
     Returns:
         DataFrame: dataframe with corrected dates and echeances (to match the situations with the ddpm ensemble)
     """
-    arome_ens_corrected = pd.DataFrame(
-        [],
-        columns=arome_ens_df.columns
-    )
-    channels = utils.get_arrays_cols(arome_ens_df)
-    delta = timedelta(hours = 6)
-    for i in range(len(arome_ens_df)):
-        values = [arome_ens_df[channels[j]].iloc[i] for j in range(len(channels))]
-        date_ech = [
-            (datetime.fromisoformat(arome_ens_df.dates.iloc[i]) + delta).isoformat(),
-            arome_ens_df.echeances.iloc[i] - 6
-        ]
-        arome_ens_corrected.loc[len(arome_ens_corrected)] = date_ech + values 
+    arome_ens_corrected = arome_ens_df.copy()
+    dates = pd.to_datetime(arome_ens_df.dates) + pd.Timedelta(hours=6)
+    arome_ens_corrected["dates"] = dates.dt.strftime("%Y-%m-%dT%H:%M:%S")
+    arome_ens_corrected["echeances"] = arome_ens_df.echeances - 6
     return arome_ens_corrected
 
 
@@ -188,13 +334,11 @@ def add_input_output(ens_df, resample, data_test_location, params):
 
 def group_ensembles(arome_df, ddpm_df):
     """
-    Groups two DataFrame containing ensemble samples / stats into a single DataFrame
+    Groups two DataFrame containing ensemble samples / stats into a single DataFrame.
+    Only the samples present in both are kept, using the merge indicator rather than scanning every cell for NaNs.
     """
-    unique_df = pd.DataFrame(
-        [],
-        columns=[]
+    unique_df = ddpm_df.merge(
+        arome_df, how="outer", on=["dates", "echeances"], suffixes=("_ddpm", "_arome"), indicator=True
     )
 
-    unique_df = ddpm_df.merge(arome_df, how="outer", on=["dates", "echeances"], suffixes=("_ddpm", "_arome"))
-
-    return unique_df.dropna().reset_index(drop=True)
\ No newline at end of file
+    return unique_df[unique_df["_merge"] == "both"].drop(columns="_merge").reset_index(drop=True)
@@ -1,13 +1,91 @@
+import numpy as np
 import utils
+import ensemble.parallel as parallel
 import matplotlib.pyplot as plt
 import matplotlib.colors as colors
 import cartopy.crs as ccrs
 import math
 
 
-def plot_maps_ensemble(ens_df, output_dir, param, unit, n_members, n=42, cmap="viridis"):
+def init_maps_figure(data, norm, param, unit, n_members, cmap="viridis"):
     """
-    Plots fields given by each member of the ensemble
+    Creates the figure, axes and images used by plot_maps_ensemble, filled with the fields of a first sample
+
+    Args:
+        data (list): fields of each member, followed by the Arome 2km5 and Arome 500m fields
+        norm (Normalize): scale shared by all the images
+        param (str): parameter to plot
+        unit (str): unit of the considered parameter
+        n_members (int): number of members
+        cmap (str, optional): colormap. Defaults to "viridis".
+
+    Returns:
+        tuple: the figure, its axes and the images drawn on each axis
+    """
+    k = math.floor(math.sqrt(n_members)) # size of the figure (number of plots / side)
+    fig = plt.figure(figsize=[5*(k+1), 4*(k+1)])
+    axs = []
+    for j in range(n_members):
+        axs.append(fig.add_subplot(k+1, k+1, j+1, projection=ccrs.PlateCarree()))
+        axs[j].set_extent(utils.IMG_EXTENT)
+        axs[j].coastlines(resolution='10m', color='black', linewidth=1)
+
+    axs.append(fig.add_subplot(k+1, k+1, k**2 + k + 1, projection=ccrs.PlateCarree()))
+    axs[n_members].set_extent(utils.IMG_EXTENT)
+    axs[n_members].coastlines(resolution='10m', color='black', linewidth=1)
+
+    axs.append(fig.add_subplot(k+1, k+1, k**2 + k + 2, projection=ccrs.PlateCarree()))
+    axs[n_members + 1].set_extent(utils.IMG_EXTENT)
+    axs[n_members + 1].coastlines(resolution='10m', color='black', linewidth=1)
+
+    images = []
+    for j in range(n_members + 2):
+        images.append(axs[j].imshow(data[j], cmap=cmap, norm=norm, origin='upper', extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree()))
+        axs[j].label_outer()
+        if j < n_members:
+            axs[j].set_title(str(j + 1), fontdict={"fontsize": 20})
+
+    axs[n_members].set_title("Arome 2km5", fontdict={"fontsize": 20})
+    axs[n_members + 1].set_title("Arome 500m", fontdict={"fontsize": 20})
+
+    fig.colorbar(images[0], ax=axs, label="{} [{}]".format(param, unit))
+    return fig, axs, images
+
+
+def render_maps(samples, output_dir, param, unit, n_members, cmap="viridis"):
+    """
+    Plots the given samples. The figure is built once, then only the data of its images is updated for each sample.
+
+    Args:
+        samples (list): (index, fields) of each sample, the fields of each member being followed by the Arome 2km5 and Arome 500m fields
+        output_dir (str): output directory
+        param (str): parameter to plot
+        unit (str): unit of the considered parameter
+        n_members (int): number of members
+        cmap (str, optional): colormap. Defaults to "viridis".
+    """
+    # same scale for all the images, updated for each sample
+    norm = colors.Normalize()
+    fig = None
+    for i, data in samples:
+        norm.vmin = min(np.ma.masked_invalid(field).min() for field in data)
+        norm.vmax = max(np.ma.masked_invalid(field).max() for field in data)
+        if fig is None:
+            fig, axs, images = init_maps_figure(data, norm, param, unit, n_members, cmap)
+        else:
+            for im, field in zip(images, data):
+                im.set_data(field)
+
+        fig.savefig(output_dir + 'results_' + str(i) + '_' + param + '.png', bbox_inches='tight')
+
+    if fig is not None:
+        plt.close(fig)
+
+
+def plot_maps_ensemble(ens_df, output_dir, param, unit, n_members, n=42, cmap="viridis", n_workers=None):
+    """
+    Plots fields given by each member of the ensemble.
+    The samples are rendered in parallel by several processes.
 
     Args:
         ens_df (DataFrame): dataframe containing the fields predicted by the model
@@ -17,44 +95,11 @@ def plot_maps_ensemble(ens_df, output_dir, param, unit, n_members, n=42, cmap="v
         n_members (int): number of members
         n (int, optional): number of images to plot. Defaults to 10.
         cmap (str, optional): colormap. Defaults to "viridis".
+        n_workers (int, optional): number of processes. Defaults to None (number of CPUs, with about 4 samples per process).
     """
-    k = math.floor(math.sqrt(n_members)) # size of the figure (number of plots / side)
-    for i in range(n):
-        fig = plt.figure(figsize=[5*(k+1), 4*(k+1)])
-        axs = []
-        for j in range(n_members):
-            axs.append(fig.add_subplot(k+1, k+1, j+1, projection=ccrs.PlateCarree()))
-            axs[j].set_extent(utils.IMG_EXTENT)
-            axs[j].coastlines(resolution='10m', color='black', linewidth=1)
-
-        axs.append(fig.add_subplot(k+1, k+1, k**2 + k + 1, projection=ccrs.PlateCarree()))
-        axs[n_members].set_extent(utils.IMG_EXTENT)
-        axs[n_members].coastlines(resolution='10m', color='black', linewidth=1)
-
-        axs.append(fig.add_subplot(k+1, k+1, k**2 + k + 2, projection=ccrs.PlateCarree()))
-        axs[n_members + 1].set_extent(utils.IMG_EXTENT)
-        axs[n_members + 1].coastlines(resolution='10m', color='black', linewidth=1)
-
-        data = [ens_df[param + "_" + str(j + 1)].iloc[i] for j in range(n_members)]
-        images = []
-        for j in range(n_members):
-            images.append(axs[j].imshow(data[j], cmap=cmap, origin='upper', extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree()))
-            axs[j].label_outer()
-            axs[j].set_title(str(j + 1), fontdict={"fontsize": 20})
+    arrays = [ens_df[param + "_" + str(j + 1)].values for j in range(n_members)]
+    arrays.append(ens_df[param + "_X"].values)
+    arrays.append(ens_df[param + "_y"].values)
 
-        images.append(axs[n_members].imshow(ens_df[param + "_X"].iloc[i], cmap=cmap, origin='upper', extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree()))
-        axs[n_members].label_outer()
-        axs[n_members].set_title("Arome 2km5", fontdict={"fontsize": 20})
-        
-        images.append(axs[n_members+1].imshow(ens_df[param + "_y"].iloc[i], cmap=cmap, origin='upper', extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree()))
-        axs[n_members + 1].label_outer()
-        axs[n_members + 1].set_title("Arome 500m", fontdict={"fontsize": 20})
-        
-        vmin = min(image.get_array().min() for image in images)
-        vmax = max(image.get_array().max() for image in images)
-        norm = colors.Normalize(vmin=vmin, vmax=vmax)
-        for im in images:
-            im.set_norm(norm)
-        
-        fig.colorbar(images[0], ax=axs, label="{} [{}]".format(param, unit))
-        plt.savefig(output_dir + 'results_' + str(i) + '_' + param + '.png', bbox_inches='tight')
\ No newline at end of file
+    samples = [(i, [arrays[j][i] for j in range(n_members + 2)]) for i in range(n)]
+    parallel.plot_in_processes(render_maps, samples, output_dir, param, unit, n_members, cmap, n_workers=n_workers)
@@ -0,0 +1,26 @@
+import os
+import math
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+
+# each process builds its own figure, reused for all the samples of its chunk
+SAMPLES_PER_WORKER = 4
+
+
+def plot_in_processes(render, samples, *args, n_workers=None):
+    """
+    Splits the samples into one chunk per process and calls render(chunk, *args) in each process.
+    The processes use the non-interactive Agg backend of matplotlib.
+    By default, the number of processes is the number of CPUs, limited so that each chunk holds about
+    SAMPLES_PER_WORKER samples.
+    """
+    if n_workers is None:
+        n_workers = min(os.cpu_count(), math.ceil(len(samples) / SAMPLES_PER_WORKER))
+    n_workers = min(len(samples), n_workers)
+    if n_workers == 0:
+        return
+    chunks = [samples[k::n_workers] for k in range(n_workers)]
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=matplotlib.use, initargs=("Agg",)) as executor:
+        futures = [executor.submit(render, chunk, *args) for chunk in chunks]
+        for future in futures:
+            future.result()
@@ -1,109 +1,164 @@
 import numpy as np
 import pandas as pd
 import utils
+import ensemble.parallel as parallel
 import matplotlib.pyplot as plt
 import matplotlib.colors as colors
 import cartopy.crs as ccrs
 
-
-def compute_pointwise_mean(ens_df, n_members, params_out):
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def select_kth(values, k, lo):
+        """
+        Partially sorts values[lo:] in place (quickselect) so that values[k] is the k-th smallest value,
+        smaller values before it and larger ones after. values[:lo] must already be smaller than values[lo:].
+        """
+        hi = values.shape[0] - 1
+        while lo < hi:
+            pivot = values[(lo + hi) // 2]
+            i, j = lo, hi
+            while i <= j:
+                while values[i] < pivot:
+                    i += 1
+                while values[j] > pivot:
+                    j -= 1
+                if i <= j:
+                    values[i], values[j] = values[j], values[i]
+                    i += 1
+                    j -= 1
+            if k <= j:
+                hi = j
+            elif k >= i:
+                lo = i
+            else:
+                break
+        return values[k]
+
+    @numba.njit(parallel=True, cache=True)
+    def quantiles_5_95(array_p):
+        """
+        Computes Q5 and Q95 (linear interpolation, as np.percentile) over the member axis of an N x M x H x W array.
+        The members of each pixel are copied in a buffer allocated once per row of the maps
+        and partially sorted in place. Rows are processed in parallel.
+        Pixels where a member is NaN give NaN quantiles.
+
+        Args:
+            array_p (ndarray): array of shape N x M x H x W (samples, members, height, width)
+
+        Returns:
+            tuple: two arrays of shape N x H x W containing Q5 and Q95
+        """
+        n_samples, n_members, height, width = array_p.shape
+        pos5, pos95 = 0.05 * (n_members - 1), 0.95 * (n_members - 1)
+        lo5, lo95 = int(pos5), int(pos95)
+        Q5 = np.empty((n_samples, height, width), dtype=array_p.dtype)
+        Q95 = np.empty((n_samples, height, width), dtype=array_p.dtype)
+        for row in numba.prange(n_samples * height):
+            i, h = row // height, row % height
+            members = np.empty(n_members, dtype=array_p.dtype)
+            for w in range(width):
+                missing = False
+                for m in range(n_members):
+                    members[m] = array_p[i, m, h, w]
+                    if np.isnan(members[m]):
+                        missing = True
+                # a missing member makes both quantiles missing, as with np.percentile
+                if missing:
+                    Q5[i, h, w] = np.nan
+                    Q95[i, h, w] = np.nan
+                    continue
+                q = select_kth(members, lo5, 0)
+                q_next = members[lo5 + 1:].min() if lo5 + 1 < n_members else q
+                Q5[i, h, w] = q + (pos5 - lo5) * (q_next - q)
+                # the members before lo5 + 1 are all smaller than Q95
+                q = select_kth(members, lo95, lo5 + 1)
+                q_next = members[lo95 + 1:].min() if lo95 + 1 < n_members else q
+                Q95[i, h, w] = q + (pos95 - lo95) * (q_next - q)
+        return Q5, Q95
+
+
+def partition_quantiles_5_95(array_p):
     """
-    Returns a dataframe containing arrays of pointwise means for each sample in the ensemble
+    Computes Q5 and Q95 (linear interpolation, as np.quantile) over the member axis of an N x M x H x W array,
+    with a single np.partition selecting the members around both quantiles.
+    Pixels where a member is NaN give NaN quantiles.
 
     Args:
-        ens_df (DataFrame): dataframe containing results
-        n_members (int): number of members in the ensemble
-        params_out (list): parameters (str) predicted by the model
+        array_p (ndarray): array of shape N x M x H x W (samples, members, height, width)
 
     Returns:
-        DataFrame: a dataframe containing all the pointwise mean maps in the ensemble for each sample
+        tuple: two arrays of shape N x H x W containing Q5 and Q95
     """
-    stat_df = pd.DataFrame(
-        [],
-        columns=["dates", "echeances"] + [p for p in params_out]
-    )
-    for i in range(len(ens_df)):
-        values = []
-        for i_p, p in enumerate(params_out):
-            array_p = np.array([ens_df[p + "_" + str(j + 1)].iloc[i] for j in range(n_members)])
-            values.append(array_p.mean(axis=0))
-        stat_df.loc[len(stat_df)] = [ens_df.dates.iloc[i], ens_df.echeances.iloc[i]] + values
-    return stat_df
-
-
-def compute_pointwise_std(ens_df, n_members, params_out):
+    n_members = array_p.shape[1]
+    pos5, pos95 = 0.05 * (n_members - 1), 0.95 * (n_members - 1)
+    lo5, lo95 = int(pos5), int(pos95)
+    hi5, hi95 = min(lo5 + 1, n_members - 1), min(lo95 + 1, n_members - 1)
+    part = np.partition(array_p, sorted({lo5, hi5, lo95, hi95}), axis=1)
+    Q5 = part[:, lo5] + (pos5 - lo5) * (part[:, hi5] - part[:, lo5])
+    Q95 = part[:, lo95] + (pos95 - lo95) * (part[:, hi95] - part[:, lo95])
+    # np.partition moves the NaNs at the end of the member axis instead of propagating them
+    missing = np.isnan(array_p).any(axis=1)
+    Q5[missing] = np.nan
+    Q95[missing] = np.nan
+    return Q5, Q95
+
+
+def compute_pointwise_stats(ens):
     """
-    Returns a dataframe containing arrays of pointwise means for each sample in the ensemble
+    Returns dataframes containing arrays of pointwise mean, std, Q5 and Q95 for each sample in the ensemble.
+    All the statistics are computed over the member axis of the fields of the ensemble.
 
     Args:
-        ens_df (DataFrame): dataframe containing results
-        n_members (int): number of members in the ensemble
-        params_out (list): parameters (str) predicted by the model
+        ens (Ensemble): ensemble (see ensemble.load_data.Ensemble)
 
     Returns:
-        DataFrame: a dataframe containing all the pointwise std maps in the ensemble for each sample
+        tuple: four dataframes (mean, std, Q5, Q95) containing all the pointwise maps in the ensemble for each sample
     """
-    stat_df = pd.DataFrame(
-        [],
-        columns=["dates", "echeances"] + [p for p in params_out]
-    )
-    for i in range(len(ens_df)):
-        values = []
-        for i_p, p in enumerate(params_out):
-            array_p = np.array([ens_df[p + "_" + str(j + 1)].iloc[i] for j in range(n_members)])
-            values.append(array_p.std(axis=0))
-        stat_df.loc[len(stat_df)] = [ens_df.dates.iloc[i], ens_df.echeances.iloc[i]] + values
-    return stat_df
-
-
-def compute_pointwise_Q5(ens_df, n_members, params_out):
+    means, stds, Q5s, Q95s = {}, {}, {}, {}
+    for p, array_p in ens.fields.items():
+        # single precision is enough for these fields and halves the memory traffic of the reductions
+        array_p = array_p.astype(np.float32, copy=False)
+        mean_p = array_p.mean(axis=1)
+        means[p] = list(mean_p)
+        stds[p] = list(array_p.std(axis=1))
+        # the kernel only beats the single np.partition when it runs on several threads
+        if numba is not None and numba.get_num_threads() > 1:
+            Q5_p, Q95_p = quantiles_5_95(array_p)
+        else:
+            Q5_p, Q95_p = partition_quantiles_5_95(array_p)
+        Q5s[p], Q95s[p] = list(Q5_p), list(Q95_p)
+
+    keys = {"dates": ens.dates, "echeances": ens.echeances}
+    return tuple(pd.DataFrame({**keys, **stat}) for stat in (means, stds, Q5s, Q95s))
+
+
+def concat_stats(mean_df, std_df, Q5_df, Q95_df, columns):
     """
-    Returns a dataframe containing arrays of pointwise Q5 for each sample in the ensemble
+    Gathers the mean, std, Q5 and Q95 maps of the given columns in a single dataframe
 
     Args:
-        ens_df (DataFrame): dataframe containing results
-        n_members (int): number of members in the ensemble
-        params_out (list): parameters (str) predicted by the model
-
-    Returns:
-        DataFrame: a dataframe containing all the pointwise Q5 maps in the ensemble for each sample
-    """
-    stat_df = pd.DataFrame(
-        [],
-        columns=["dates", "echeances"] + [p for p in params_out]
-    )
-    for i in range(len(ens_df)):
-        values = []
-        for i_p, p in enumerate(params_out):
-            array_p = np.array([ens_df[p + "_" + str(j + 1)].iloc[i] for j in range(n_members)])
-            values.append(np.percentile(array_p, 5, axis=0))
-        stat_df.loc[len(stat_df)] = [ens_df.dates.iloc[i], ens_df.echeances.iloc[i]] + values
-    return stat_df
-
-
-def compute_pointwise_Q95(ens_df, n_members, params_out):
-    """
-    Returns a dataframe containing arrays of pointwise Q95 for each sample in the ensemble
-
-    Args:
-        ens_df (DataFrame): dataframe containing results
-        n_members (int): number of members in the ensemble
-        params_out (list): parameters (str) predicted by the model
+        mean_df (DataFrame): a dataframe that contains the mean values
+        std_df (DataFrame): a dataframe that contains the std values
+        Q5_df (DataFrame): a dataframe that contais the Q5 values
+        Q95_df (DataFrame): a dataframe that contains the Q95 values
+        columns (list): columns (str) to gather
 
     Returns:
-        DataFrame: a dataframe containing all the pointwise Q95 maps in the ensemble for each sample
+        DataFrame: dates, echeances and a column per stat and per given column, suffixed with the name of the stat
     """
-    stat_df = pd.DataFrame(
-        [],
-        columns=["dates", "echeances"] + [p for p in params_out]
+    return pd.concat(
+        [mean_df[["dates", "echeances"]]] + [
+            stat_df[columns].rename(columns={c:c + suffix for c in columns})
+            for stat_df, suffix in zip([mean_df, std_df, Q5_df, Q95_df], ["_mean", "_std", "_Q5", "_Q95"])
+        ],
+        axis=1
     )
-    for i in range(len(ens_df)):
-        values = []
-        for i_p, p in enumerate(params_out):
-            array_p = np.array([ens_df[p + "_" + str(j + 1)].iloc[i] for j in range(n_members)])
-            values.append(np.percentile(array_p, 95, axis=0))
-        stat_df.loc[len(stat_df)] = [ens_df.dates.iloc[i], ens_df.echeances.iloc[i]] + values
-    return stat_df
 
 
 def plot_unique_all_stats_ensemble(mean_df, std_df, Q5_df, Q95_df, output_dir, param):
@@ -118,15 +173,7 @@ def plot_unique_all_stats_ensemble(mean_df, std_df, Q5_df, Q95_df, output_dir, p
         output_dir (st): output directory
         param (str): studied parameter
     """
-    all_stats_df = pd.DataFrame(
-        [],
-        columns = []
-    )
-    all_stats_df = pd.concat([all_stats_df, mean_df[["dates", "echeances"]]], axis=1)
-    all_stats_df = pd.concat([all_stats_df, mean_df[[param]].rename(columns={param:param + "_mean"})], axis=1)
-    all_stats_df = pd.concat([all_stats_df,  std_df[[param]].rename(columns={param:param + "_std"})], axis=1)
-    all_stats_df = pd.concat([all_stats_df,   Q5_df[[param]].rename(columns={param:param + "_Q5"})], axis=1)
-    all_stats_df = pd.concat([all_stats_df,  Q95_df[[param]].rename(columns={param:param + "_Q95"})], axis=1)
+    all_stats_df = concat_stats(mean_df, std_df, Q5_df, Q95_df, [param])
 
     fig = plt.figure(figsize=[25, 5])
     axs = []
@@ -135,29 +182,30 @@ def plot_unique_all_stats_ensemble(mean_df, std_df, Q5_df, Q95_df, output_dir, p
         axs[j].set_extent(utils.IMG_EXTENT)
         axs[j].coastlines(resolution='10m', color='black', linewidth=1)
 
+    data = [all_stats_df[param + s].mean() for s in ["_mean", "_std", "_Q5", "_Q95"]]
+    # same scale for mean, Q5, Q95 images
+    norm = colors.Normalize(
+        vmin=min(np.ma.masked_invalid(data[j]).min() for j in [0, 2, 3]),
+        vmax=max(np.ma.masked_invalid(data[j]).max() for j in [0, 2, 3])
+    )
+
     images = []
 
-    im = axs[0].imshow(all_stats_df[param + "_mean"].mean(), cmap="viridis", origin='upper', 
+    im = axs[0].imshow(data[0], cmap="viridis", norm=norm, origin='upper', 
                         extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
     images.append(im)
     axs[0].label_outer()
-    im = axs[1].imshow(all_stats_df[param + "_std"].mean(), cmap="plasma", origin='upper', 
+    im = axs[1].imshow(data[1], cmap="plasma", origin='upper', 
                         extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
     fig.colorbar(im, ax=axs[1])
-    im = axs[2].imshow(all_stats_df[param + "_Q5"].mean(), cmap="viridis", origin='upper', 
+    im = axs[2].imshow(data[2], cmap="viridis", norm=norm, origin='upper', 
                         extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
     images.append(im)
     axs[2].label_outer()
-    im = axs[3].imshow(all_stats_df[param + "_Q95"].mean(), cmap="viridis", origin='upper', 
+    im = axs[3].imshow(data[3], cmap="viridis", norm=norm, origin='upper', 
                         extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
     images.append(im)
     axs[3].label_outer()        
-    
-    vmin = min(image.get_array().min() for image in images)
-    vmax = max(image.get_array().max() for image in images)
-    norm = colors.Normalize(vmin=vmin, vmax=vmax)
-    for im in images:
-        im.set_norm(norm)
 
     fig.colorbar(images[0], ax=axs[0])
     fig.colorbar(images[0], ax=axs[2])
@@ -171,6 +219,85 @@ def plot_unique_all_stats_ensemble(mean_df, std_df, Q5_df, Q95_df, output_dir, p
     plt.savefig(output_dir + 'all_stats_unique_' + param + '.png', bbox_inches='tight')
 
 
+def init_synthesis_figure(data, echeances, norm, norm_std):
+    """
+    Creates the figure, axes and images used by synthesis_all_stats_ensemble, filled with the stats of a first day
+
+    Args:
+        data (list): for each echeance, the mean, std, Q5 and Q95 maps of DDPM then of Arome
+        echeances (list): echeances (int) of a day
+        norm (Normalize): scale shared by the mean, Q5 and Q95 images
+        norm_std (Normalize): scale shared by the std images
+
+    Returns:
+        tuple: the figure, its axes and the images drawn on each axis
+    """
+    fig = plt.figure(figsize=[25, 11*len(echeances)])
+    axs = []
+    for j in range(8 * len(echeances)):
+        axs.append(fig.add_subplot(2*len(echeances), 4, j+1, projection=ccrs.PlateCarree()))
+        axs[j].set_extent(utils.IMG_EXTENT)
+        axs[j].coastlines(resolution='10m', color='black', linewidth=1)
+
+    all_images = []
+    for j in range(8 * len(echeances)):
+        if j % 4 == 1:
+            cmap, norm_j = "plasma", norm_std
+        else:
+            cmap, norm_j = "viridis", norm
+        all_images.append(axs[j].imshow(data[j], cmap=cmap, norm=norm_j, origin='upper', 
+                            extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree()))
+        axs[j].label_outer()
+
+    for i_ech, ech in enumerate(echeances):
+        for j in range(8):
+            # images[0] for mean, Q5, Q95 maps and stds[0] for std maps
+            fig.colorbar(all_images[1 if j % 4 == 1 else 0], ax=axs[j + 8*i_ech])
+
+        axs[0 + 8*i_ech].set_title("mean DDPM, +" + str(ech) + "h")
+        axs[1 + 8*i_ech].set_title("std DDPM, +" + str(ech) + "h")
+        axs[2 + 8*i_ech].set_title("Q5 DDPM, +" + str(ech) + "h")
+        axs[3 + 8*i_ech].set_title("Q95 DDPM, +" + str(ech) + "h")
+        axs[4 + 8*i_ech].set_title("mean Arome, +" + str(ech) + "h")
+        axs[5 + 8*i_ech].set_title("std Arome, +" + str(ech) + "h")
+        axs[6 + 8*i_ech].set_title("Q5 Arome, +" + str(ech) + "h")
+        axs[7 + 8*i_ech].set_title("Q95 Arome, +" + str(ech) + "h")
+
+    return fig, axs, all_images
+
+
+def render_synthesis(samples, echeances, output_dir, param):
+    """
+    Plots all stats for all echeances of the given days (DDPM + Arome).
+    The figure is built once, then only the data of its images is updated for each day.
+
+    Args:
+        samples (list): (date, maps) of each day, maps being for each echeance the mean, std, Q5 and Q95 maps of DDPM then of Arome
+        echeances (list): echeances (int) of a day
+        output_dir (str): output directory
+        param (str): studied parameter
+    """
+    # one scale for all mean, Q5, Q95 images and another for std images, updated for each day
+    norm, norm_std = colors.Normalize(), colors.Normalize()
+    fig = None
+    for d, data in samples:
+        norm.vmin = min(np.ma.masked_invalid(field).min() for j, field in enumerate(data) if j % 4 != 1)
+        norm.vmax = max(np.ma.masked_invalid(field).max() for j, field in enumerate(data) if j % 4 != 1)
+        norm_std.vmin = min(np.ma.masked_invalid(field).min() for j, field in enumerate(data) if j % 4 == 1)
+        norm_std.vmax = max(np.ma.masked_invalid(field).max() for j, field in enumerate(data) if j % 4 == 1)
+
+        if fig is None:
+            fig, axs, all_images = init_synthesis_figure(data, echeances, norm, norm_std)
+        else:
+            for im, field in zip(all_images, data):
+                im.set_data(field)
+
+        fig.savefig(output_dir + 'all_stats_synthesis_unique_' + param + "_" + d + '.png', bbox_inches='tight')
+
+    if fig is not None:
+        plt.close(fig)
+
+
 def synthesis_all_stats_ensemble(
     mean_df,
     std_df,
@@ -178,105 +305,28 @@ def synthesis_all_stats_ensemble(
     Q95_df,
     output_dir,
     param,
-    n=42
+    n=42,
+    n_workers=None
 ):
     """
-    Plots for each day all stats for all echeances (DDPM + Arome)
+    Plots for each day all stats for all echeances (DDPM + Arome).
+    The days are rendered in parallel by several processes (n_workers, defaults to the number of CPUs, with about 4 days per process).
     """
-    all_stats_df = pd.DataFrame(
-        [],
-        columns = []
-    )
-    all_stats_df = pd.concat([all_stats_df, mean_df[["dates", "echeances"]]], axis=1)
-    all_stats_df = pd.concat([all_stats_df, mean_df[[param + m for m in ["_arome", "_ddpm"]]].rename(columns={param+ m:param + m + "_mean" for m in ["_arome", "_ddpm"]})], axis=1)
-    all_stats_df = pd.concat([all_stats_df,  std_df[[param + m for m in ["_arome", "_ddpm"]]].rename(columns={param+ m:param + m + "_std" for m in ["_arome", "_ddpm"]})], axis=1)
-    all_stats_df = pd.concat([all_stats_df,   Q5_df[[param + m for m in ["_arome", "_ddpm"]]].rename(columns={param+ m:param + m + "_Q5" for m in ["_arome", "_ddpm"]})], axis=1)
-    all_stats_df = pd.concat([all_stats_df,  Q95_df[[param + m for m in ["_arome", "_ddpm"]]].rename(columns={param+ m:param + m + "_Q95" for m in ["_arome", "_ddpm"]})], axis=1)
+    all_stats_df = concat_stats(mean_df, std_df, Q5_df, Q95_df, [param + m for m in ["_arome", "_ddpm"]])
 
     dates = mean_df.dates.drop_duplicates().values
     echeances = mean_df.echeances.drop_duplicates().values
+    stat_cols = [param + m + s for m in ["_ddpm", "_arome"] for s in ["_mean", "_std", "_Q5", "_Q95"]]
 
-    for i_d, d in enumerate(dates):
-        fig = plt.figure(figsize=[25, 11*len(echeances)])
-        axs = []
-        for j in range(8 * len(echeances)):
-            axs.append(fig.add_subplot(2*len(echeances), 4, j+1, projection=ccrs.PlateCarree()))
-            axs[j].set_extent(utils.IMG_EXTENT)
-            axs[j].coastlines(resolution='10m', color='black', linewidth=1)
-
-        images = []
-        stds = []
-        
-        for i_ech, ech in enumerate(echeances):
-            im = axs[0 + 8*i_ech].imshow(all_stats_df[(all_stats_df.dates == d)][(all_stats_df.echeances == ech)][param + "_ddpm_mean"].iloc[0], cmap="viridis", origin='upper', 
-                                extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
-            images.append(im)
-            axs[0 + 8*i_ech].label_outer()
-            im = axs[1 + 8*i_ech].imshow(all_stats_df[(all_stats_df.dates == d)][(all_stats_df.echeances == ech)][param + "_ddpm_std"].iloc[0], cmap="plasma", origin='upper', 
-                                extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
-            stds.append(im)
-            axs[1 + 8*i_ech].label_outer()
-            im = axs[2 + 8*i_ech].imshow(all_stats_df[(all_stats_df.dates == d)][(all_stats_df.echeances == ech)][param + "_ddpm_Q5"].iloc[0], cmap="viridis", origin='upper', 
-                                extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
-            images.append(im)
-            axs[2 + 8*i_ech].label_outer()
-            im = axs[3 + 8*i_ech].imshow(all_stats_df[(all_stats_df.dates == d)][(all_stats_df.echeances == ech)][param + "_ddpm_Q95"].iloc[0], cmap="viridis", origin='upper', 
-                                extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
-            images.append(im)
-            axs[3 + 8*i_ech].label_outer()    
-
-            im = axs[4 + 8*i_ech].imshow(all_stats_df[(all_stats_df.dates == d)][(all_stats_df.echeances == ech)][param + "_arome_mean"].iloc[0], cmap="viridis", origin='upper', 
-                                extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
-            images.append(im)
-            axs[4 + 8*i_ech].label_outer()
-            im = axs[5 + 8*i_ech].imshow(all_stats_df[(all_stats_df.dates == d)][(all_stats_df.echeances == ech)][param + "_arome_std"].iloc[0], cmap="plasma", origin='upper', 
-                                extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
-            stds.append(im)
-            axs[1 + 8*i_ech].label_outer()
-            im = axs[6 + 8*i_ech].imshow(all_stats_df[(all_stats_df.dates == d)][(all_stats_df.echeances == ech)][param + "_arome_Q5"].iloc[0], cmap="viridis", origin='upper', 
-                                extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
-            images.append(im)
-            axs[6 + 8*i_ech].label_outer()
-            im = axs[7 + 8*i_ech].imshow(all_stats_df[(all_stats_df.dates == d)][(all_stats_df.echeances == ech)][param + "_arome_Q95"].iloc[0], cmap="viridis", origin='upper', 
-                                extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
-            images.append(im)
-            axs[7 + 8*i_ech].label_outer()        
-        
-        # same scale for all mean, Q5, Q95 images
-        vmin = min(image.get_array().min() for image in images)
-        vmax = max(image.get_array().max() for image in images)
-        norm = colors.Normalize(vmin=vmin, vmax=vmax)
-        for im in images:
-            im.set_norm(norm)
-
-        # another scale for std images
-        vmin = min(std.get_array().min() for std in stds)
-        vmax = max(std.get_array().max() for std in stds)
-        norm = colors.Normalize(vmin=vmin, vmax=vmax)
-        for std in stds:
-            std.set_norm(norm)
-
-
-        for i_ech, ech in enumerate(echeances):
-            fig.colorbar(images[0], ax=axs[0 + 8*i_ech])
-            fig.colorbar(images[0], ax=axs[2 + 8*i_ech])
-            fig.colorbar(images[0], ax=axs[3 + 8*i_ech])
-            fig.colorbar(images[0], ax=axs[4 + 8*i_ech])
-            fig.colorbar(images[0], ax=axs[6 + 8*i_ech])
-            fig.colorbar(images[0], ax=axs[7 + 8*i_ech])
-            fig.colorbar(stds[0], ax=axs[1 + 8*i_ech])
-            fig.colorbar(stds[0], ax=axs[5 + 8*i_ech])
-
-            axs[0 + 8*i_ech].set_title("mean DDPM, +" + str(ech) + "h")
-            axs[1 + 8*i_ech].set_title("std DDPM, +" + str(ech) + "h")
-            axs[2 + 8*i_ech].set_title("Q5 DDPM, +" + str(ech) + "h")
-            axs[3 + 8*i_ech].set_title("Q95 DDPM, +" + str(ech) + "h")
-            axs[4 + 8*i_ech].set_title("mean Arome, +" + str(ech) + "h")
-            axs[5 + 8*i_ech].set_title("std Arome, +" + str(ech) + "h")
-            axs[6 + 8*i_ech].set_title("Q5 Arome, +" + str(ech) + "h")
-            axs[7 + 8*i_ech].set_title("Q95 Arome, +" + str(ech) + "h")
-
-        plt.savefig(output_dir + 'all_stats_synthesis_unique_' + param + "_" + d + '.png', bbox_inches='tight')
+    samples = []
+    for d in dates:
+        data = []
+        for ech in echeances:
+            sample = all_stats_df[(all_stats_df.dates == d) & (all_stats_df.echeances == ech)]
+            data += [sample[c].iloc[0] for c in stat_cols]
+        samples.append((d, data))
+
+    parallel.plot_in_processes(render_synthesis, samples, echeances, output_dir, param, n_workers=n_workers)
 
 
 def synthesis_unique_all_stats_ensemble(
@@ -291,15 +341,7 @@ def synthesis_unique_all_stats_ensemble(
     """
     Plots a unique map for each stat (DDPM + Arome)
     """
-    all_stats_df = pd.DataFrame(
-        [],
-        columns = []
-    )
-    all_stats_df = pd.concat([all_stats_df, mean_df[["dates", "echeances"]]], axis=1)
-    all_stats_df = pd.concat([all_stats_df, mean_df[[param + m for m in ["_arome", "_ddpm"]]].rename(columns={param+ m:param + m + "_mean" for m in ["_arome", "_ddpm"]})], axis=1)
-    all_stats_df = pd.concat([all_stats_df,  std_df[[param + m for m in ["_arome", "_ddpm"]]].rename(columns={param+ m:param + m + "_std" for m in ["_arome", "_ddpm"]})], axis=1)
-    all_stats_df = pd.concat([all_stats_df,   Q5_df[[param + m for m in ["_arome", "_ddpm"]]].rename(columns={param+ m:param + m + "_Q5" for m in ["_arome", "_ddpm"]})], axis=1)
-    all_stats_df = pd.concat([all_stats_df,  Q95_df[[param + m for m in ["_arome", "_ddpm"]]].rename(columns={param+ m:param + m + "_Q95" for m in ["_arome", "_ddpm"]})], axis=1)
+    all_stats_df = concat_stats(mean_df, std_df, Q5_df, Q95_df, [param + m for m in ["_arome", "_ddpm"]])
 
     fig = plt.figure(figsize=[25, 11])
     axs = []
@@ -308,56 +350,30 @@ def synthesis_unique_all_stats_ensemble(
         axs[j].set_extent(utils.IMG_EXTENT)
         axs[j].coastlines(resolution='10m', color='black', linewidth=1)
 
-    images = []
-    stds = []
+    stat_cols = [param + m + s for m in ["_ddpm", "_arome"] for s in ["_mean", "_std", "_Q5", "_Q95"]]
+    data = [all_stats_df[c].mean() for c in stat_cols]
 
-    im = axs[0].imshow(all_stats_df[param + "_ddpm_mean"].mean(), cmap="viridis", origin='upper', 
-                        extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
-    images.append(im)
-    axs[0].label_outer()
-    im = axs[1].imshow(all_stats_df[param + "_ddpm_std"].mean(), cmap="plasma", origin='upper', 
-                        extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
-    stds.append(im)
-    axs[1].label_outer()
-    im = axs[2].imshow(all_stats_df[param + "_ddpm_Q5"].mean(), cmap="viridis", origin='upper', 
-                        extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
-    images.append(im)
-    axs[2].label_outer()
-    im = axs[3].imshow(all_stats_df[param + "_ddpm_Q95"].mean(), cmap="viridis", origin='upper', 
-                        extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
-    images.append(im)
-    axs[3].label_outer()    
-
-    im = axs[4].imshow(all_stats_df[param + "_arome_mean"].mean(), cmap="viridis", origin='upper', 
-                        extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
-    images.append(im)
-    axs[4].label_outer()
-    im = axs[5].imshow(all_stats_df[param + "_arome_std"].mean(), cmap="plasma", origin='upper', 
-                        extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
-    stds.append(im)
-    axs[1].label_outer()
-    im = axs[6].imshow(all_stats_df[param + "_arome_Q5"].mean(), cmap="viridis", origin='upper', 
-                        extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
-    images.append(im)
-    axs[6].label_outer()
-    im = axs[7].imshow(all_stats_df[param + "_arome_Q95"].mean(), cmap="viridis", origin='upper', 
-                        extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree())
-    images.append(im)
-    axs[7].label_outer()        
-    
     # same scale for all mean, Q5, Q95 images
-    vmin = min(image.get_array().min() for image in images)
-    vmax = max(image.get_array().max() for image in images)
-    norm = colors.Normalize(vmin=vmin, vmax=vmax)
-    for im in images:
-        im.set_norm(norm)
-
+    norm = colors.Normalize(
+        vmin=min(np.ma.masked_invalid(field).min() for j, field in enumerate(data) if j % 4 != 1),
+        vmax=max(np.ma.masked_invalid(field).max() for j, field in enumerate(data) if j % 4 != 1)
+    )
     # another scale for std images
-    vmin = min(std.get_array().min() for std in stds)
-    vmax = max(std.get_array().max() for std in stds)
-    norm = colors.Normalize(vmin=vmin, vmax=vmax)
-    for std in stds:
-        std.set_norm(norm)
+    norm_std = colors.Normalize(
+        vmin=min(np.ma.masked_invalid(field).min() for j, field in enumerate(data) if j % 4 == 1),
+        vmax=max(np.ma.masked_invalid(field).max() for j, field in enumerate(data) if j % 4 == 1)
+    )
+
+    images = []
+    stds = []
+    for j in range(8):
+        if j % 4 == 1:
+            stds.append(axs[j].imshow(data[j], cmap="plasma", norm=norm_std, origin='upper', 
+                                extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree()))
+        else:
+            images.append(axs[j].imshow(data[j], cmap="viridis", norm=norm, origin='upper', 
+                                extent=utils.IMG_EXTENT, transform=ccrs.PlateCarree()))
+        axs[j].label_outer()
 
     fig.colorbar(images[0], ax=axs[0])
     fig.colorbar(images[0], ax=axs[2])
@@ -385,19 +401,17 @@ def synthesis_stat_distrib(mean_df, std_df, Q5_df, Q95_df, output_dir, param):
     Plots all stats distributions (Arome + DDPM)
     """
     D = np.zeros((len(mean_df), 6))
-    for i in range(len(mean_df)):
-        D[i, 0] = mean_df[param + "_ddpm"].iloc[i].mean()
-        D[i, 1] = Q5_df[param + "_ddpm"].iloc[i].mean()
-        D[i, 2] = Q95_df[param + "_ddpm"].iloc[i].mean()
-        D[i, 3] = mean_df[param + "_arome"].iloc[i].mean()
-        D[i, 4] = Q5_df[param + "_arome"].iloc[i].mean()
-        D[i, 5] = Q95_df[param + "_arome"].iloc[i].mean()
+    D[:, 0] = np.stack(mean_df[param + "_ddpm"].values).mean(axis=(1, 2))
+    D[:, 1] = np.stack(Q5_df[param + "_ddpm"].values).mean(axis=(1, 2))
+    D[:, 2] = np.stack(Q95_df[param + "_ddpm"].values).mean(axis=(1, 2))
+    D[:, 3] = np.stack(mean_df[param + "_arome"].values).mean(axis=(1, 2))
+    D[:, 4] = np.stack(Q5_df[param + "_arome"].values).mean(axis=(1, 2))
+    D[:, 5] = np.stack(Q95_df[param + "_arome"].values).mean(axis=(1, 2))
     labels = ['mean DDPM', 'Q5 DDPM', 'Q95 DDPM', 'mean Arome', 'Q5 Arome', 'Q95 Arome']
 
     D_std = np.zeros((len(mean_df), 2))
-    for i in range(len(mean_df)):
-        D_std[i, 0] = std_df[param + "_ddpm"].iloc[i].mean()
-        D_std[i, 1] = std_df[param + "_arome"].iloc[i].mean()
+    D_std[:, 0] = np.stack(std_df[param + "_ddpm"].values).mean(axis=(1, 2))
+    D_std[:, 1] = np.stack(std_df[param + "_arome"].values).mean(axis=(1, 2))
     labels_std = ['std DDPM', 'std Arome']
 
     
@@ -37,7 +37,7 @@ if __name__ == "__main__":
         n_members=ens_opt_arome["n_members"],
         data_location=ens_opt_arome["data_location"]
     )
-    arome_ensemble = lde.correct_dates_for_arome(arome_ensemble)
+    arome_ensemble = lde.correct_dates_for_arome(arome_ensemble.to_dataframe())
     arome_ensemble = lde.add_input_output(
         arome_ensemble,
         opt["data_loading"]["interp"],
@@ -48,8 +48,9 @@ if __name__ == "__main__":
     ddpm_ensemble = lde.load_ensemble_ddpm(
         working_dir=opt["path"]["working_dir"],
         n_members=ens_opt_ddpm["n_members"],
-        params=opt["data_loading"]["params_out"]
-    )
+        params=opt["data_loading"]["params_out"],
+        cache_path=ens_opt_ddpm.get("cache_path")
+    ).to_dataframe()
     ddpm_ensemble = lde.add_input_output(
         ddpm_ensemble,
         opt["data_loading"]["interp"],
@@ -90,14 +91,8 @@ if __name__ == "__main__":
     #     )
 
     #     # plot stats
-    #     mean_arome = stats.compute_pointwise_mean(arome_ensemble, ens_opt_arome["n_members"], opt["data_loading"]["params_out"])
-    #     std_arome  = stats.compute_pointwise_std(arome_ensemble, ens_opt_arome["n_members"], opt["data_loading"]["params_out"])
-    #     Q5_arome   = stats.compute_pointwise_Q5(arome_ensemble, ens_opt_arome["n_members"], opt["data_loading"]["params_out"])
-    #     Q95_arome  = stats.compute_pointwise_Q95(arome_ensemble, ens_opt_arome["n_members"], opt["data_loading"]["params_out"])
-    #     mean_ddpm  = stats.compute_pointwise_mean(ddpm_ensemble , ens_opt_ddpm["n_members"] , opt["data_loading"]["params_out"])
-    #     std_ddpm   = stats.compute_pointwise_std(ddpm_ensemble , ens_opt_ddpm["n_members"] , opt["data_loading"]["params_out"])
-    #     Q5_ddpm    = stats.compute_pointwise_Q5(ddpm_ensemble , ens_opt_ddpm["n_members"] , opt["data_loading"]["params_out"])
-    #     Q95_ddpm   = stats.compute_pointwise_Q95(ddpm_ensemble , ens_opt_ddpm["n_members"] , opt["data_loading"]["params_out"])
+    #     mean_arome, std_arome, Q5_arome, Q95_arome = stats.compute_pointwise_stats(lde.Ensemble.from_dataframe(arome_ensemble, ens_opt_arome["n_members"], opt["data_loading"]["params_out"]))
+    #     mean_ddpm, std_ddpm, Q5_ddpm, Q95_ddpm     = stats.compute_pointwise_stats(lde.Ensemble.from_dataframe(ddpm_ensemble , ens_opt_ddpm["n_members"] , opt["data_loading"]["params_out"]))
 
     #     mean = lde.group_ensembles(mean_arome, mean_ddpm) 
     #     std  = lde.group_ensembles(std_arome, std_ddpm) 
@@ -189,7 +184,8 @@ if __name__ == "__main__":
             n_members=ens_opt_arome["n_members"],
             n=opt["results"]["images"]["n"],
             cmap="viridis",
-            unit="m/s"
+            unit="m/s",
+            n_workers=opt["ensemble"].get("n_workers")
         )
 
         maps.plot_maps_ensemble(
@@ -199,18 +195,13 @@ if __name__ == "__main__":
             n_members=ens_opt_ddpm["n_members"],
             n=opt["results"]["images"]["n"],
             cmap="viridis",
-            unit="m/s"
+            unit="m/s",
+            n_workers=opt["ensemble"].get("n_workers")
         )
 
         # plot stats
-        mean_arome = stats.compute_pointwise_mean(modulus_arome, ens_opt_arome["n_members"], ["modulus"])
-        std_arome  = stats.compute_pointwise_std(modulus_arome, ens_opt_arome["n_members"], ["modulus"])
-        Q5_arome   = stats.compute_pointwise_Q5(modulus_arome, ens_opt_arome["n_members"], ["modulus"])
-        Q95_arome  = stats.compute_pointwise_Q95(modulus_arome, ens_opt_arome["n_members"], ["modulus"])
-        mean_ddpm  = stats.compute_pointwise_mean(modulus_ddpm , ens_opt_ddpm["n_members"] , ["modulus"])
-        std_ddpm   = stats.compute_pointwise_std(modulus_ddpm , ens_opt_ddpm["n_members"] , ["modulus"])
-        Q5_ddpm    = stats.compute_pointwise_Q5(modulus_ddpm , ens_opt_ddpm["n_members"] , ["modulus"])
-        Q95_ddpm   = stats.compute_pointwise_Q95(modulus_ddpm , ens_opt_ddpm["n_members"] , ["modulus"])
+        mean_arome, std_arome, Q5_arome, Q95_arome = stats.compute_pointwise_stats(lde.Ensemble.from_dataframe(modulus_arome, ens_opt_arome["n_members"], ["modulus"]))
+        mean_ddpm, std_ddpm, Q5_ddpm, Q95_ddpm     = stats.compute_pointwise_stats(lde.Ensemble.from_dataframe(modulus_ddpm , ens_opt_ddpm["n_members"] , ["modulus"]))
 
         mean = lde.group_ensembles(mean_arome, mean_ddpm) 
         std  = lde.group_ensembles(std_arome, std_ddpm) 
@@ -225,7 +216,8 @@ if __name__ == "__main__":
             Q95,
             output_dir,
             "modulus",
-            n=opt["results"]["images"]["n"]
+            n=opt["results"]["images"]["n"],
+            n_workers=opt["ensemble"].get("n_workers")
         )
 
         stats.synthesis_stat_distrib(